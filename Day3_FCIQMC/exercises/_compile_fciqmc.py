@@ -0,0 +1,16 @@
+from numba.pycc import CC
+import fciqmc_kernels
+
+# Ahead-of-time compile the FCIQMC kernels into the extension module 'fciqmc_kernels_aot', so that
+# fciqmc_partI.py can skip the JIT compilation on startup. Build it by running this file:
+#   python _compile_fciqmc.py
+# and then opt in to using it with the FCIQMC_AOT environment variable:
+#   FCIQMC_AOT=1 python fciqmc_partI.py
+# The build is not updated automatically, so rerun this after any change to fciqmc_kernels.py.
+# The exported signature matches the types used in fciqmc_partI.py (single precision hamiltonian
+# elements and walker amplitudes, and 32-bit CSR indices). Note that the compiled kernel runs serially.
+cc = CC('fciqmc_kernels_aot')
+cc.export('spawn', 'Tuple((i8[:], f4[:]))(i8[:], f4[:], i8[:], f8[:], i4[:], i4[:], f4[:], f8)')(fciqmc_kernels.spawn.py_func)
+
+if __name__ == '__main__':
+    cc.compile()
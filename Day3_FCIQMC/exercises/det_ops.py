@@ -1,10 +1,102 @@
 import numpy as np
+from numba import njit
+
+@njit(cache=True)
+def _idx2(i, j):
+    ''' Canonical compound index of the orbital pair (i,j), with i and j interchangeable.
+    Also works elementwise on arrays of orbital indices. '''
+    hi = np.maximum(i, j)
+    lo = np.minimum(i, j)
+    return hi*(hi+1)//2 + lo
+
+@njit(cache=True)
+def _idx4(i, j, k, l):
+    ''' Canonical index into the packed integral array for the spatial integral (ij|kl).
+    All 8 permutationally equivalent orderings of the indices map to the same value. '''
+    return _idx2(_idx2(i, j), _idx2(k, l))
+
+@njit(cache=True)
+def _eri(eri_packed, nbasis, a, b, c, d):
+    ''' Return the two electron integral between spin-orbitals a, b, c and d (in chemical ordering).
+    This is zero unless orbitals a and b, and orbitals c and d, share the same spin. '''
+    if (a < nbasis) != (b < nbasis) or (c < nbasis) != (d < nbasis):
+        return 0.0
+    return eri_packed[_idx4(a % nbasis, b % nbasis, c % nbasis, d % nbasis)]
+
+@njit(cache=True)
+def _slater_condon_diag(det, h1, eri_packed, nbasis, nn):
+    ''' Compiled kernel for the diagonal hamiltonian matrix element of det (an int64 array of occupied orbitals) '''
+    hel = nn
+    for pos in range(len(det)):
+        p = det[pos]
+        hel += h1[p,p]
+        for q_idx in range(pos+1, len(det)):
+            q = det[q_idx]
+            hel += _eri(eri_packed, nbasis, p, p, q, q) - _eri(eri_packed, nbasis, p, q, q, p)
+    return hel
+
+@njit(cache=True)
+def _slater_condon_single(det, h1, eri_packed, nbasis, orb_from, orb_to):
+    ''' Compiled kernel for the hamiltonian matrix element of a single excitation from orb_from to orb_to
+    out of det (an int64 array of occupied orbitals), without the parity '''
+    hel = h1[orb_from, orb_to]
+    for q in det:
+        hel += _eri(eri_packed, nbasis, orb_from, orb_to, q, q) - _eri(eri_packed, nbasis, orb_from, q, q, orb_to)
+    return hel
+
+@njit(cache=True)
+def _slater_condon_batch(dets, orbs_from, orbs_to, nexcit, parities, h1, eri_packed, nbasis, nn):
+    ''' Compiled kernel for a batch of hamiltonian matrix elements. Row b of dets holds the occupied orbitals of
+    the original determinant, nexcit[b] the excitation level, and the first nexcit[b] entries of rows b of
+    orbs_from and orbs_to the orbitals excited from and to. Returns the array of matrix elements. '''
+    hels = np.zeros(dets.shape[0])
+    for b in range(dets.shape[0]):
+        if nexcit[b] == 0:
+            hels[b] = _slater_condon_diag(dets[b], h1, eri_packed, nbasis, nn)
+        elif nexcit[b] == 1:
+            hels[b] = _slater_condon_single(dets[b], h1, eri_packed, nbasis, orbs_from[b,0], orbs_to[b,0])
+        elif nexcit[b] == 2:
+            i, j = orbs_from[b,0], orbs_from[b,1]
+            a, c = orbs_to[b,0], orbs_to[b,1]
+            hels[b] = _eri(eri_packed, nbasis, i, a, j, c) - _eri(eri_packed, nbasis, i, c, j, a)
+        hels[b] *= parities[b]
+    return hels
+
+class RAND_BUFFER:
+    def __init__(self, rng, size=100000):
+        ''' Hand out single random numbers from a buffer, which is refilled from the numpy Generator rng
+        in large batches. This avoids the overhead of calling into numpy for every random number. '''
+        self.rng = rng
+        self.size = size
+        self.refill()
+        return
+
+    def refill(self):
+        ''' Draw a new batch of uniform random numbers. These are stored as a list of python floats,
+        which are faster to hand out one at a time than the elements of a numpy array. '''
+        self.buf = self.rng.random(self.size).tolist()
+        self.ptr = 0
+        return
+
+    def random(self):
+        ''' Return a uniform random number in [0,1) '''
+        if self.ptr == self.size:
+            self.refill()
+        val = self.buf[self.ptr]
+        self.ptr += 1
+        return val
+
+    def integers(self, low, high):
+        ''' Return a uniform random integer in [low,high) '''
+        return low + int(self.random()*(high-low))
 
 class HAM:
-    def __init__(self, filename = 'FCIDUMP', p_single = 0.05):
+    def __init__(self, filename = 'FCIDUMP', p_single = 0.05, rng = None):
         ''' Define a hamiltonian to sample, as well as its quantum numbers.
         In addition, it defines the probability of generating a single excitation, rather than double
-        excitation in the random excitation generator (which is a method of this class).
+        excitation in the random excitation generator (which is a method of this class), and sets up
+        the random numbers used by the excitation generator, drawn from the numpy Generator rng
+        (for a simulation, pass in sim_params.rng so that these follow the simulation seed).
         Finally, it also defines a reference determinant energy.'''
 
         # All these quantities are defined by the 'read_in_fcidump' method
@@ -17,11 +109,12 @@ class HAM:
 
         # The one-electron hamiltonian in the spin-orbital basis 
         self.h1 = None
-        # The two-electron hamiltonian in the spin-orbital basis
+        # The unique two-electron integrals in the spatial-orbital basis, packed into a 1D array.
+        # Use the 'eri' method to access them in the spin-orbital basis.
         # Note that eri[i,j,k,l] = < phi_i(r_1) phi_k(r_2) | 1/r12 | phi_j(r_1) phi_l(r_2) >
         # This ordering is called 'chemical ordering', and means that the first two indices of the array
         # define the charge density for electron 1, and the second two for electron two.
-        self.h2 = None
+        self.eri_packed = None
         # The (scalar) nuclear-nuclear repulsion energy
         self.nn = None
 
@@ -30,6 +123,11 @@ class HAM:
         # The probability of generating a single excitation rather than a double excitation
         self.p_single = p_single
 
+        # The buffered source of random numbers for the excitation generator
+        if rng is None:
+            rng = np.random.default_rng()
+        self.rand = RAND_BUFFER(rng)
+
         # Define a reference determinant and reference energy.
         # Ideally, this should be the energy of the lowest-energy determinant in the space.
         # In a HF basis, this will generally be the first occupied orbitals. Assume so.
@@ -50,10 +148,11 @@ class HAM:
 
         as well as the integrals defining the hamiltonian terms:
         self.h1[:,:]        # A self.spin_basis x self.spin_basis matrix of one-electron terms
-        self.h2[:,:,:,:]    # A rank-4 self.spin_basis array for the two electron terms
+        self.eri_packed[:]  # The unique spatial two electron terms, indexed by the '_idx4' function
         self.nn             # The (scalar) nuclear repulsion energy
 
-        Note that the integrals are defined in the spin-orbital basis, and the self.h2 term is defined as follows:
+        Note that self.h1 is defined in the spin-orbital basis, while self.eri_packed only holds the spatial
+        integrals. The spin-orbital two electron terms are returned by the 'eri' method, defined as follows:
         eri[i,j,k,l] = < phi_i(r_1) phi_k(r_2) | 1/r12 | phi_j(r_1) phi_l(r_2) >
         This ordering is called 'chemical ordering', and means that the first two indices of the array
         define the charge density for electron 1, and the second two for electron two.'''
@@ -94,72 +193,40 @@ class HAM:
         # We order things with alpha, then beta spins
         self.spin_basis = 2*self.nbasis
         self.h1 = np.zeros((self.spin_basis, self.spin_basis))
-        # Ignore permutational symmetry
-        self.h2 = np.zeros((self.spin_basis, self.spin_basis, self.spin_basis, self.spin_basis))
-        dat = finp.readline().split()
-        while dat:
-            ii, jj, kk, ll = [int(x) for x in dat[1:5]] # Note these are 1-indexed
-            i = ii-1
-            j = jj-1
-            k = kk-1
-            l = ll-1
-            if kk != 0:
-                # Two electron integral - 8 spatial permutations x 4 spin (=32) allowed permutations!
-                # alpha, alpha, alpha, alpha
-                self.h2[i, j, k, l] = float(dat[0])
-                self.h2[j, i, k, l] = float(dat[0])
-                self.h2[i, j, l, k] = float(dat[0])
-                self.h2[j, i, l, k] = float(dat[0])
-                self.h2[k, l, i, j] = float(dat[0])
-                self.h2[l, k, i, j] = float(dat[0])
-                self.h2[k, l, j, i] = float(dat[0])
-                self.h2[l, k, j, i] = float(dat[0])
-
-                # beta, beta, beta, beta
-                self.h2[i+self.nbasis, j+self.nbasis, k+self.nbasis, l+self.nbasis] = float(dat[0])
-                self.h2[j+self.nbasis, i+self.nbasis, k+self.nbasis, l+self.nbasis] = float(dat[0])
-                self.h2[i+self.nbasis, j+self.nbasis, l+self.nbasis, k+self.nbasis] = float(dat[0])
-                self.h2[j+self.nbasis, i+self.nbasis, l+self.nbasis, k+self.nbasis] = float(dat[0])
-                self.h2[k+self.nbasis, l+self.nbasis, i+self.nbasis, j+self.nbasis] = float(dat[0])
-                self.h2[l+self.nbasis, k+self.nbasis, i+self.nbasis, j+self.nbasis] = float(dat[0])
-                self.h2[k+self.nbasis, l+self.nbasis, j+self.nbasis, i+self.nbasis] = float(dat[0])
-                self.h2[l+self.nbasis, k+self.nbasis, j+self.nbasis, i+self.nbasis] = float(dat[0])
-
-                # alpha, alpha, beta, beta
-                self.h2[i, j, k+self.nbasis, l+self.nbasis] = float(dat[0])
-                self.h2[j, i, k+self.nbasis, l+self.nbasis] = float(dat[0])
-                self.h2[i, j, l+self.nbasis, k+self.nbasis] = float(dat[0])
-                self.h2[j, i, l+self.nbasis, k+self.nbasis] = float(dat[0])
-                self.h2[k, l, i+self.nbasis, j+self.nbasis] = float(dat[0])
-                self.h2[l, k, i+self.nbasis, j+self.nbasis] = float(dat[0])
-                self.h2[k, l, j+self.nbasis, i+self.nbasis] = float(dat[0])
-                self.h2[l, k, j+self.nbasis, i+self.nbasis] = float(dat[0])
-
-                # beta, beta, alpha, alpha
-                self.h2[i+self.nbasis, j+self.nbasis, k, l] = float(dat[0])
-                self.h2[j+self.nbasis, i+self.nbasis, k, l] = float(dat[0])
-                self.h2[i+self.nbasis, j+self.nbasis, l, k] = float(dat[0])
-                self.h2[j+self.nbasis, i+self.nbasis, l, k] = float(dat[0])
-                self.h2[k+self.nbasis, l+self.nbasis, i, j] = float(dat[0])
-                self.h2[l+self.nbasis, k+self.nbasis, i, j] = float(dat[0])
-                self.h2[k+self.nbasis, l+self.nbasis, j, i] = float(dat[0])
-                self.h2[l+self.nbasis, k+self.nbasis, j, i] = float(dat[0])
-            elif kk == 0:
-                if jj != 0:
-                    # One electron term
-                    self.h1[i,j] = float(dat[0])
-                    self.h1[j,i] = float(dat[0])
-                    self.h1[i+self.nbasis, j+self.nbasis] = float(dat[0])
-                    self.h1[j+self.nbasis, i+self.nbasis] = float(dat[0])
-                else:
-                    # Nuclear repulsion term
-                    self.nn = float(dat[0])
-            dat = finp.readline().split()
+        # Only store the unique spatial two-electron integrals, making use of their 8-fold permutational symmetry.
+        # The spin-orbital integrals are then recovered by the 'eri' method.
+        npair = self.nbasis*(self.nbasis+1)//2
+        self.eri_packed = np.zeros(npair*(npair+1)//2)
+        # The remaining lines all have the same format: the integral value, followed by the four orbital labels.
+        # Read them in at once, and convert the labels to be 0-indexed (so that unused labels become -1).
+        ints = np.loadtxt(finp, ndmin=2)
+        vals = ints[:,0]
+        i, j, k, l = (ints[:,1:5].astype(np.int64) - 1).T
+
+        # Two electron integrals - all 8 spatial permutations share a single canonical index
+        two_elec = k >= 0
+        self.eri_packed[_idx4(i[two_elec], j[two_elec], k[two_elec], l[two_elec])] = vals[two_elec]
+
+        # One electron terms
+        one_elec = ~two_elec & (j >= 0)
+        i1, j1, val1 = i[one_elec], j[one_elec], vals[one_elec]
+        self.h1[i1, j1] = val1
+        self.h1[j1, i1] = val1
+        self.h1[i1+self.nbasis, j1+self.nbasis] = val1
+        self.h1[j1+self.nbasis, i1+self.nbasis] = val1
+
+        # Nuclear repulsion term
+        self.nn = float(vals[~two_elec & (j < 0)][-1])
 
         print('System file read in.')
         finp.close()
         return
 
+    def eri(self, a, b, c, d):
+        ''' Return the two electron integral between spin-orbitals a, b, c and d (in chemical ordering).
+        This is zero unless orbitals a and b, and orbitals c and d, share the same spin. '''
+        return _eri(self.eri_packed, self.nbasis, a, b, c, d)
+
     def slater_condon(self, det, excited_det, excit_mat, parity):
         ''' Calculate the hamiltonian matrix element between two determinants, det and excited_det.
         In:
@@ -175,23 +242,18 @@ class HAM:
 
         if excit_mat is None:
             # diagonal
-            hel = self.nn
-            for pos, p in enumerate(det):
-                hel += self.h1[p,p]
-                for q in det[pos+1:None]:
-                    hel += self.h2[p,p,q,q] - self.h2[p,q,q,p]
+            det_arr = np.asarray(det, dtype=np.int64)
+            hel = _slater_condon_diag(det_arr, self.h1, self.eri_packed, self.nbasis, self.nn)
 
         elif len(excit_mat[0]) == 1:
             # single
-            hel = self.h1[excit_mat[0][0],excit_mat[1][0]]
-            for q in det:
-                hel += self.h2[excit_mat[0][0], excit_mat[1][0], q, q] - \
-                 self.h2[excit_mat[0][0], q, q, excit_mat[1][0]]
+            det_arr = np.asarray(det, dtype=np.int64)
+            hel = _slater_condon_single(det_arr, self.h1, self.eri_packed, self.nbasis, excit_mat[0][0], excit_mat[1][0])
 
         elif len(excit_mat[0]) == 2:
             # double
-            hel = self.h2[excit_mat[0][0], excit_mat[1][0], excit_mat[0][1], excit_mat[1][1]] - \
-                 self.h2[excit_mat[0][0], excit_mat[1][1], excit_mat[0][1], excit_mat[1][0]]
+            hel = self.eri(excit_mat[0][0], excit_mat[1][0], excit_mat[0][1], excit_mat[1][1]) - \
+                 self.eri(excit_mat[0][0], excit_mat[1][1], excit_mat[0][1], excit_mat[1][0])
 
         else:
             # >2 excitation level
@@ -201,6 +263,34 @@ class HAM:
 
         return hel
 
+    def slater_condon_many(self, dets, excited_dets, excit_mats, parities):
+        ''' Calculate a batch of hamiltonian matrix elements at once, amortizing the python overhead of
+        slater_condon over the batch. The arguments are lists of the arguments to slater_condon, one entry
+        per matrix element. All determinants should have the same number of electrons.
+        Out:
+            A numpy array of the hamiltonian matrix elements'''
+
+        nbatch = len(dets)
+        if nbatch == 0:
+            return np.zeros(0)
+        dets_arr = np.array(dets, dtype=np.int64).reshape(nbatch, -1)
+        # Pack the excitation matrices into fixed width arrays (unused entries are -1), and record the excitation level
+        orbs_from = np.full((nbatch, 2), -1, dtype=np.int64)
+        orbs_to = np.full((nbatch, 2), -1, dtype=np.int64)
+        nexcit = np.zeros(nbatch, dtype=np.int64)
+        parities_arr = np.ones(nbatch)
+        for b, (excit_mat, parity) in enumerate(zip(excit_mats, parities)):
+            if excit_mat is not None:
+                nexcit[b] = len(excit_mat[0])
+                if nexcit[b] <= 2:
+                    orbs_from[b,:nexcit[b]] = excit_mat[0]
+                    orbs_to[b,:nexcit[b]] = excit_mat[1]
+            if parity is not None:
+                parities_arr[b] = parity
+
+        return _slater_condon_batch(dets_arr, orbs_from, orbs_to, nexcit, parities_arr,
+                self.h1, self.eri_packed, self.nbasis, self.nn)
+
     def excit_gen(self, det):
         from scipy.special import comb
         ''' Take in a determinant, and create a single or double excitation or it.
@@ -212,38 +302,60 @@ class HAM:
             o The parity of the excitation
             o The normalized probability of the excitation'''
 
-        excited_det = det.copy()
-        single = np.random.random() < self.p_single
-
-        ind = np.random.randint(0, len(excited_det))
-        orb_from = excited_det[ind]
-        orb_to = np.random.randint(0,2 * self.nbasis)
-        while orb_to in det:
-            orb_to = np.random.randint(0,2 * self.nbasis)
+        # Work on an int64 array copy of the determinant, which is kept ordered in place by _elec_exchange_ops
+        excited_det = np.array(det, dtype=np.int64)
+        # Bitstring of the orbitals occupied in det, for constant-time occupation checks
+        occ_bits = det_to_bits(det)
+        single = self.rand.random() < self.p_single
+
+        ind = self.rand.integers(0, len(excited_det))
+        orb_from = det[ind]
+        orb_to = self.rand.integers(0, 2 * self.nbasis)
+        while (occ_bits >> orb_to) & 1:
+            orb_to = self.rand.integers(0, 2 * self.nbasis)
         excited_det[ind] = orb_to
-        perm = elec_exchange_ops(excited_det, ind)
-        excited_det = sorted(excited_det)
+        perm = _elec_exchange_ops(excited_det, ind)
 
         if single:
             excit_mat = [(orb_from,), (orb_to,)]
             prob = self.p_single/(self.nelec*(2*self.nbasis - self.nelec))
         else:
             # do a double excitation
-            ind = np.random.randint(0, len(excited_det))
-            orb_from_2 = excited_det[ind]
-            orb_to_2 = np.random.randint(0, 2 * self.nbasis)
-            while (orb_to_2 in excited_det) or (orb_to_2 == orb_from) or (orb_from_2 == orb_to):
-                # ^ make sure we're not just replacing the singly-excited electron
-                ind = np.random.randint(0, len(excited_det))
-                orb_from_2 = excited_det[ind]
-                orb_to_2 = np.random.randint(0, 2 * self.nbasis)
+            ind = self.rand.integers(0, len(excited_det))
+            orb_from_2 = int(excited_det[ind])
+            orb_to_2 = self.rand.integers(0, 2 * self.nbasis)
+            while ((occ_bits >> orb_to_2) & 1) or (orb_to_2 == orb_to) or (orb_from_2 == orb_to):
+                # ^ make sure orb_to_2 is unoccupied in both det and excited_det (which also rules out orb_from),
+                # and that we're not just replacing the singly-excited electron
+                ind = self.rand.integers(0, len(excited_det))
+                orb_from_2 = int(excited_det[ind])
+                orb_to_2 = self.rand.integers(0, 2 * self.nbasis)
             excited_det[ind] = orb_to_2
-            perm += elec_exchange_ops(excited_det, ind)
+            perm += _elec_exchange_ops(excited_det, ind)
             excit_mat = [(orb_from,orb_from_2), (orb_to,orb_to_2)]
             prob = (1 - self.p_single) / (comb(2*self.nbasis - self.nelec, 2)*comb(self.nelec, 2))
-            excited_det = sorted(excited_det)
 
-        return excited_det, excit_mat, (-1)**perm, prob
+        return excited_det.tolist(), excit_mat, (-1)**perm, prob
+
+@njit(cache=True)
+def _elec_exchange_ops(det, ind):
+    ''' Compiled kernel for elec_exchange_ops, acting on an int64 array of occupied orbitals.
+    The array is sorted in place as the exchanges are made. '''
+    n = len(det)
+    if ind < 0:
+        ind += n
+    perm = 0
+    # Exchange the element up the list while it is larger than its neighbour...
+    while ind+1 < n and det[ind] > det[ind+1]:
+        det[ind], det[ind+1] = det[ind+1], det[ind]
+        ind += 1
+        perm += 1
+    # ...or down the list while it is smaller.
+    while ind > 0 and det[ind] < det[ind-1]:
+        det[ind], det[ind-1] = det[ind-1], det[ind]
+        ind -= 1
+        perm += 1
+    return perm
 
 def elec_exchange_ops(det, ind):
     ''' Given a determinant defined by a list of occupied orbitals
@@ -256,60 +368,54 @@ def elec_exchange_ops(det, ind):
     
     Return: The number of pairwise permutations required.'''
 
-    perm = 0
-    det_copy = det.copy()
-    if ind == 0:
-        step = 1
-    elif (ind == -1) or (ind == len(det)-1):
-        step = -1
-    else:
-        step = 1 if det[ind] > det[ind + 1] else -1
-    while det_copy != sorted(det_copy):
-        tmp = det_copy[ind+step]
-        det_copy[ind+step] = det_copy[ind]
-        det_copy[ind] = tmp
-        ind+=step
-        perm += 1
-    return perm
-
-def calc_excit_mat_parity(det, excited_det):
-    ''' Given two determinants (excitations of each other), calculate and return 
-    the excitation matrix (see the definition in the slater-condon function), 
+    return _elec_exchange_ops(np.array(det, dtype=np.int64), ind)
+
+def det_to_bits(det):
+    ''' Encode a determinant, given as a list of occupied orbitals, as an integer bitstring
+    where bit p is set if orbital p is occupied '''
+    bits = 0
+    for orb in det:
+        bits |= 1 << orb
+    return bits
+
+def bits_to_det(bits):
+    ''' Decode an integer bitstring into the ordered list of occupied orbitals '''
+    det = []
+    while bits:
+        lsb = bits & -bits
+        det.append(lsb.bit_length()-1)
+        bits ^= lsb
+    return det
+
+def mask_between(i, j):
+    ''' Return a bitmask with all bits strictly between orbitals i and j set '''
+    lo, hi = min(i, j), max(i, j)
+    return ((1 << hi)-1) ^ ((1 << (lo+1))-1)
+
+def calc_excit_mat_parity(det_bits, excited_bits):
+    ''' Given two determinants (excitations of each other) as integer bitstrings (see det_to_bits),
+    calculate and return the excitation matrix (see the definition in the slater-condon function),
     and parity of the excitation'''
 
-    # find the indices being excited from
-    from_inds = []
-    from_orbs = []
-    for from_ind, from_orb in enumerate(det):
-        if from_orb not in excited_det:
-            from_inds.append(from_ind)
-            from_orbs.append(from_orb)
-
-    to_inds = []
-    to_orbs = []
-    for to_ind, to_orb in enumerate(excited_det):
-        if to_orb not in det:
-            to_inds.append(to_ind)
-            to_orbs.append(to_orb)
+    # The orbitals which differ between the determinants, split by which determinant occupies them
+    diff = det_bits ^ excited_bits
+    from_orbs = bits_to_det(diff & det_bits)
+    to_orbs = bits_to_det(diff & excited_bits)
 
     # found all the indices
-    assert len(from_inds) == len(to_inds)
+    assert len(from_orbs) == len(to_orbs)
+    if not from_orbs:
+        return None, None
     excit_mat = [tuple(from_orbs), tuple(to_orbs)]
 
-    perm=0
-    det_copy = det.copy()
+    # Apply each replacement in turn. The number of electron exchanges needed to reorder the determinant
+    # is the number of occupied orbitals lying between the orbital excited from and the one excited to.
+    perm = 0
     for from_orb, to_orb in zip(from_orbs, to_orbs):
-        ind = det_copy.index(from_orb)
-        det_copy[ind] = to_orb
-        perm += elec_exchange_ops(det_copy,ind)
-        det_copy = sorted(det_copy)
-
-    parity = (-1)**perm
-
-    if not list(excit_mat):
-        excit_mat = parity = None
+        perm += bin(det_bits & mask_between(from_orb, to_orb)).count('1')
+        det_bits ^= (1 << from_orb) | (1 << to_orb)
 
-    return excit_mat, parity
+    return excit_mat, (-1)**perm
 
 if __name__ == '__main__':
     import matplotlib.pyplot as plt
@@ -345,6 +451,12 @@ if __name__ == '__main__':
             print('Expected hamiltonian matrix element: {}'.format(correct_hels[i]))
             print('Returned hamiltonian matrix element: {}'.format(hel))
 
+    # Check that the batched version agrees with slater_condon for all of these matrix elements
+    hels = sys_ham.slater_condon_many(*zip(*test_ham_els))
+    assert(np.allclose(hels, [sys_ham.slater_condon(*test_ham_el) for test_ham_el in test_ham_els]))
+    assert(len(sys_ham.slater_condon_many([], [], [], [])) == 0)
+    print('Batched hamiltonian matrix elements agree with slater_condon.')
+
     # elec_exchange_ops unit tests 
     print('Running unit tests for elec_exchange_ops function...')
     # A list of test determinants and exchanged orbital indices.
@@ -387,16 +499,14 @@ if __name__ == '__main__':
         # Check that returned determinant is an ordered list
         assert(all(excited_det[i] <= excited_det[i+1] for i in range(len(excited_det)-1)))
 
-        # Store the excited determinant
-        if repr(excited_det) in excited_dets:
-            excited_dets[repr(excited_det)] += 1./(prob*n_att)
-        else:
-            excited_dets[repr(excited_det)] = 1./(prob*n_att)
+        # Store the excited determinant, labelled by its bitstring representation
+        det_bits = det_to_bits(excited_det)
+        excited_dets[det_bits] = excited_dets.get(det_bits, 0.) + 1./(prob*n_att)
     # Create list of n_gen / (N_att x prob) for all excited determinants
     print('Total number of excitations generated: {}'.format(len(excited_dets)))
     probs = []
-    for excited_det, prob_sum in list(excited_dets.items()):
-        print('Excitation generated: {}'.format(excited_det))
+    for det_bits, prob_sum in list(excited_dets.items()):
+        print('Excitation generated: {}'.format(bits_to_det(det_bits)))
         probs.append(prob_sum)
     plt.plot(range(len(probs)), probs, label='normalized generation frequency')
     plt.axhline(1.0,label='Exact distribution desired')
@@ -414,7 +524,7 @@ if __name__ == '__main__':
 
         # Now check that the excit_mat and parity are the same if calculated
         # independently from the calc_excit_mat_parity function.
-        excit_mat_2, parity_2 = calc_excit_mat_parity(det_root, excited_det)
+        excit_mat_2, parity_2 = calc_excit_mat_parity(det_to_bits(det_root), det_to_bits(excited_det))
         if excit_mat_2 == excit_mat and parity == parity_2:
             print('Excitation matrix and parity agree between the two functions for attempt {}'.format(i))
         # Note that the parity should change if we swap the indices of either the excited from or excited to orbitals
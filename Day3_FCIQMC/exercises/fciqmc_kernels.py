@@ -0,0 +1,45 @@
+import numpy as np
+from numba import njit, prange
+
+@njit(parallel=True, nogil=True, cache=True)
+def spawn(walker_inds, walker_amps, nspawn, spawn_rands, h_indptr, h_indices, h_data, timestep):
+    ''' Perform all the spawning attempts of an iteration, in parallel over the walkers.
+    Each spawning attempt picks uniformly from the determinants connected to its parent by the hamiltonian.
+    In:
+        walker_inds:    The hamiltonian index of each occupied determinant
+        walker_amps:    The walker amplitude on each occupied determinant
+        nspawn:         The number of spawning attempts to make from each occupied determinant
+        spawn_rands:    Uniform random numbers in [0,1), one for each spawning attempt (sum(nspawn) in total)
+        h_indptr, h_indices, h_data:
+                        The off-diagonal part of the hamiltonian, in CSR format
+        timestep:       The timestep of the propagation
+    Out:
+        The hamiltonian index and weight of each spawned walker (in the precision of h_data).
+        The spawns from each walker are stored contiguously, in the same order as the walkers.'''
+
+    # Find where the spawns of each walker start in the output arrays, so that each walker can write independently
+    offsets = np.zeros(len(nspawn)+1, dtype=np.int64)
+    offsets[1:] = np.cumsum(nspawn)
+    spawn_inds = np.empty(offsets[-1], dtype=np.int64)
+    spawn_weights = np.empty(offsets[-1], dtype=h_data.dtype)
+
+    for iw in prange(len(walker_inds)):
+        det_ind = walker_inds[iw]
+        # Extract the row of connections from this determinant once, for all of its spawning attempts
+        row_inds = h_indices[h_indptr[det_ind]:h_indptr[det_ind+1]]
+        row_vals = h_data[h_indptr[det_ind]:h_indptr[det_ind+1]]
+        nconn = len(row_inds)
+        if nconn == 0:
+            # No connected determinants to spawn to
+            for i in range(offsets[iw], offsets[iw+1]):
+                spawn_inds[i] = det_ind
+                spawn_weights[i] = 0.0
+            continue
+        # The probability of picking each connected determinant is 1/nconn
+        det_weight = -timestep*walker_amps[iw]*nconn/nspawn[iw]
+        for i in range(offsets[iw], offsets[iw+1]):
+            k = int(spawn_rands[i]*nconn)
+            spawn_inds[i] = row_inds[k]
+            spawn_weights[i] = det_weight*row_vals[k]
+
+    return spawn_inds, spawn_weights
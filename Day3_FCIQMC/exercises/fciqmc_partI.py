@@ -1,22 +1,49 @@
 import numpy as np
+import scipy.sparse
+from scipy.sparse.linalg import eigsh
+import os
 import system
-
-# Read in the full Hamiltonian of all configurations
-full_h = np.load('Full_Ham_6H.npy')
+if os.environ.get('FCIQMC_AOT', '0') == '1':
+    # Opt in to the ahead-of-time compiled kernel (see _compile_fciqmc.py). This runs serially, and must be
+    # rebuilt after any change to fciqmc_kernels.py.
+    from fciqmc_kernels_aot import spawn
+    print('Using ahead-of-time compiled spawning kernel from fciqmc_kernels_aot')
+else:
+    from fciqmc_kernels import spawn
+    print('Using JIT compiled spawning kernel from fciqmc_kernels')
+
+# Read in the full Hamiltonian of all configurations, and store it as a sparse (CSR) matrix,
+# since most determinants are not connected by the hamiltonian.
+full_h = scipy.sparse.csr_matrix(np.load('Full_Ham_6H.npy'))
 ndet = full_h.shape[0]
-print('Hamiltonian read in of dimension {} x {}'.format(ndet,ndet))
-
-# Exactly diagonalize the full hamiltonian, to get a benchmark number for the exact ground state energy
-print('Completely diagonalizing full hamiltonian (may be slow...)')
-e, v = np.linalg.eigh(full_h)
-print('Ground state energy of full hamiltonian is {}'.format(e[0]))
+print('Hamiltonian read in of dimension {} x {}, with {} non-zero elements'.format(ndet,ndet,full_h.nnz))
+
+# Exactly diagonalize the full hamiltonian, to get a benchmark number for the exact ground state energy.
+# Only the lowest eigenvalue is needed, so for larger hamiltonians just find this with the Lanczos algorithm.
+if ndet < 500:
+    print('Completely diagonalizing full hamiltonian')
+    e0 = np.linalg.eigvalsh(full_h.toarray())[0]
+else:
+    print('Finding lowest eigenvalue of full hamiltonian with Lanczos (may be slow...)')
+    e0 = eigsh(full_h, k=1, which='SA', return_eigenvectors=False)[0]
+print('Ground state energy of full hamiltonian is {}'.format(e0))
 
 # Find the reference energy from the first element of the Hamiltonian.
 # Define h_sim, which is where the reference energy has been removed from the diagonal of the hamiltonian
 ref_energy = full_h[0,0]
-h_sim = full_h - np.eye(full_h.shape[0])*ref_energy
+h_sim = (full_h - scipy.sparse.identity(ndet, format='csr')*ref_energy).tocsr()
 print('Removing reference energy from simulated hamiltonian')
 
+# Spawning only ever needs the off-diagonal part of the hamiltonian. Store this separately, without any
+# numerically zero elements, so that spawns are only attempted onto determinants which are actually connected.
+offdiag_h = (full_h - scipy.sparse.diags(full_h.diagonal())).tocsr()
+offdiag_h.data[np.abs(offdiag_h.data) < 1.e-12] = 0.0
+offdiag_h.eliminate_zeros()
+# FCIQMC is a stochastic algorithm, and the sampling noise far outweighs the error from storing the
+# spawning matrix elements and walker amplitudes in single precision. This halves the memory traffic.
+# The diagonal of the hamiltonian (for the death step) and the energy estimators are kept in double precision.
+offdiag_h = offdiag_h.astype(np.float32)
+
 # Setup simulation parameters. See system.py for details.  
 sim_params = system.PARAMS(totwalkers=20000, initwalkers=10, init_shift=0.0,
         shift_damp=0.1, timestep=1.e-2, det_thresh=0.25, eqm_iters=500,
@@ -25,74 +52,71 @@ sim_params = system.PARAMS(totwalkers=20000, initwalkers=10, init_shift=0.0,
 # See system.py for more details.
 sim_stats = system.STATS(sim_params, filename='fciqmc_stats', ref_energy=ref_energy)
 
-# Set up walker object as a dictionary.
-# Initially, label determinants by their index in the hamiltonian array.
-walkers = {0: sim_params.nwalk_init}
+# Set up walkers as a pair of arrays: the index in the hamiltonian array of each occupied determinant,
+# and the signed walker amplitude on that determinant.
+walker_inds = np.array([0], dtype=np.int64)
+walker_amps = np.array([sim_params.nwalk_init], dtype=np.float32)
 sim_stats.nw = sim_params.nwalk_init
 
+# Cache the (contiguous) diagonal of the hamiltonian and the reference energy for the death step
+diag_h = full_h.diagonal()
+h00 = float(full_h[0,0])
+# Extract the column of h_sim connecting each determinant to the reference once, as a dense array, for the energy estimator
+h_ref = h_sim[:,0].toarray().ravel()
+
 # Loop through iterations
 for sim_stats.iter_curr in range(sim_params.max_iter):
 
-    spawned_walkers = {}    # Dictionary to hold the spawned walkers of each iteration
-    sim_stats.nw = 0.0      # Recompute number of walkers each iteration
-    sim_stats.ref_weight = 0.0
-    sim_stats.nocc_dets = 0
-
-    # Iterate over occupied determinants (keys) in the walker dictionary
-    # Since we are modifying inplace, want to convert to a list, rather than setting up an iterator
-    for det_ind, det_amp in list(walkers.items()):
-
-        # Accumulate current walker contribution to energy expectation values
-        # and update reference weight
-        if det_ind == 0:
-            sim_stats.cycle_en_denom += det_amp
-            sim_stats.ref_weight = det_amp
-        else:
-            sim_stats.cycle_en_num += det_amp*h_sim[det_ind,0]
-
-        # Stochastically round the walkers, if their amplitude is too low to ensure the walker list remains compact.
-        # This will rely on determining whether the amplitude is above or below sim_params.det_thresh (\chi in notes), and either
-        # stochastically increasing it to this threshold value, or deleting it and skipping to the next determinant.
-        chi_fraction = abs(det_amp)/sim_params.det_thresh
-        if chi_fraction < 1:
-            # det below threshold
-            if np.random.random() < chi_fraction:
-                det_amp = sim_params.det_thresh
-            else:
-                del walkers[det_ind]
-                continue
-
-
-        # Update statistic for the number of walkers, and number of occupied determinants
-        sim_stats.nw += abs(det_amp)
-        sim_stats.nocc_dets += 1
-
-        # Do a number of SPAWNING STEPS proportional to the modulus of the determinant amplitude, and
-        # put any spawned walkers in the appropriate dictionary.
-        nspawn = int(np.ceil(abs(det_amp)))
-        for spawn_attempt in range(nspawn):
-            spawn_ind = np.random.randint(ndet)
-            while (spawn_ind == det_ind):
-                spawn_ind = np.random.randint(ndet)
-            p_spawn = 1./(ndet-1)
-            spawn_weight = -sim_params.timestep*full_h[det_ind, spawn_ind]*det_amp/(p_spawn*nspawn)
-            if spawn_ind in spawned_walkers:
-                spawned_walkers[spawn_ind] += spawn_weight
-            else:
-                spawned_walkers[spawn_ind] = spawn_weight
-
-
-
-        # DEATH STEP: Modify the amplitude of the determinant
-        walkers[det_ind] -= sim_params.timestep*(full_h[det_ind, det_ind] - full_h[0,0] - sim_params.shift)*det_amp
-        
-
-    # ANNIHILATION. Run through the list of newly spawned walkers, and merge with the main list.
-    for spawn_ind, spawn_weight in spawned_walkers.items():
-        if spawn_ind in walkers:
-            walkers[spawn_ind] += spawn_weight
-        else:
-            walkers[spawn_ind] = spawn_weight
+    # Accumulate current walker contribution to energy expectation values
+    # and update reference weight
+    ref_mask = walker_inds == 0
+    sim_stats.ref_weight = walker_amps[ref_mask].sum(dtype=np.float64)
+    sim_stats.cycle_en_denom += sim_stats.ref_weight
+    sim_stats.cycle_en_num += np.dot(walker_amps[~ref_mask], h_ref[walker_inds[~ref_mask]])
+
+    # Stochastically round the walkers, if their amplitude is too low to ensure the walker list remains compact.
+    # This will rely on determining whether the amplitude is above or below sim_params.det_thresh (\chi in notes), and either
+    # stochastically increasing it to this threshold value, or deleting it.
+    # The moduli of the amplitudes are kept alongside, so they only need to be computed once.
+    abs_amps = np.abs(walker_amps)
+    chi_fraction = abs_amps/sim_params.det_thresh
+    below_thresh = chi_fraction < 1
+    round_up = sim_params.rng.random(len(walker_amps)) < chi_fraction
+    rounded = below_thresh & round_up
+    walker_amps = np.where(rounded, np.copysign(sim_params.det_thresh, walker_amps), walker_amps)
+    abs_amps[rounded] = sim_params.det_thresh
+    keep = ~below_thresh | round_up
+    walker_inds = walker_inds[keep]
+    walker_amps = walker_amps[keep]
+    abs_amps = abs_amps[keep]
+
+    # Update statistic for the number of walkers, and number of occupied determinants
+    sim_stats.nw = abs_amps.sum(dtype=np.float64)
+    sim_stats.nocc_dets = len(walker_inds)
+
+    # Do a number of SPAWNING STEPS proportional to the modulus of the determinant amplitude.
+    # The random numbers are all drawn up front, and the spawning itself is done by a compiled kernel.
+    nspawn = np.ceil(abs_amps).astype(np.int64, copy=False)
+    spawn_rands = sim_params.rng.random(nspawn.sum())
+    spawn_inds, spawn_weights = spawn(walker_inds, walker_amps, nspawn, spawn_rands,
+            offdiag_h.indptr, offdiag_h.indices, offdiag_h.data, sim_params.timestep)
+
+    # DEATH STEP: Modify the amplitude of the determinants
+    walker_amps -= sim_params.timestep*(diag_h[walker_inds] - h00 - sim_params.shift)*walker_amps
+
+    # ANNIHILATION. Combine the walkers with the newly spawned walkers in a single pass: sort them all by
+    # determinant index, and sum the amplitudes over each run of equal indices.
+    all_inds = np.concatenate((walker_inds, spawn_inds))
+    all_amps = np.concatenate((walker_amps, spawn_weights))
+    order = np.argsort(all_inds, kind='stable')
+    all_inds = all_inds[order]
+    starts = np.flatnonzero(np.diff(all_inds, prepend=-1))
+    walker_inds = all_inds[starts]
+    walker_amps = np.add.reduceat(all_amps[order], starts)
+    # Remove any determinants left with exactly zero amplitude
+    nonzero = walker_amps != 0.0
+    walker_inds = walker_inds[nonzero]
+    walker_amps = walker_amps[nonzero]
 
 # Every sim_params.stats_cycle iterations, readjust shift (if in variable shift mode) and print out statistics.
     if sim_stats.iter_curr % sim_params.stats_cycle == 0:
@@ -1,23 +1,24 @@
 import numpy as np
-import ast
 import system
 import det_ops
 
-# Read in the Hamiltonian integrals from file
-sys_ham = det_ops.HAM(filename = 'FCIDUMP.6H', p_single=0.1) 
-ref_energy = sys_ham.slater_condon(sys_ham.ref_det, sys_ham.ref_det, None, None)
-
 # Setup simulation parameters. See system.py for details.  
 sim_params = system.PARAMS(totwalkers=20000 , initwalkers=100, init_shift=0.1,
         shift_damp=0.025, timestep=2.e-2, det_thresh=0.75, eqm_iters=500,
         max_iter=150000, stats_cycle=5, seed=7, init_thresh=2.0)
+
+# Read in the Hamiltonian integrals from file. The excitation generator draws its random numbers
+# from the simulation random number generator.
+sys_ham = det_ops.HAM(filename = 'FCIDUMP.6H', p_single=0.1, rng=sim_params.rng)
+ref_energy = sys_ham.slater_condon(sys_ham.ref_det, sys_ham.ref_det, None, None)
 # Setup a statistics object, which accumulates various run-time variables.
 # See system.py for more details.
 sim_stats = system.STATS(sim_params, filename='fciqmc_stats', ref_energy=ref_energy)
 
 # Set up walker object as a dictionary.
-# Label determinants by the string representation of the list of occupied orbitals
-walkers = {repr(sys_ham.ref_det): sim_params.nwalk_init}
+# Label determinants by their integer bitstring representation (see det_ops.det_to_bits)
+ref_bits = det_ops.det_to_bits(sys_ham.ref_det)
+walkers = {ref_bits: sim_params.nwalk_init}
 sim_stats.nw = sim_params.nwalk_init
 
 for sim_stats.iter_curr in range(sim_params.max_iter):
@@ -30,33 +31,33 @@ for sim_stats.iter_curr in range(sim_params.max_iter):
     # Iterate over occupied (not all) determinants (keys) in the dictionary
     # Note that this is python3 format
     # Since we are modifying inplace, want to use .items, rather than setting up a true iterator
-    for det_str, det_amp in list(walkers.items()):
+    for det_bits, det_amp in list(walkers.items()):
         is_initiator = not sim_params.det_thresh or (det_amp > sim_params.det_thresh)
         # if det_thresh is 0 or 'falsey', this is an initiator, else it is one only if det_amp > det_thresh
 
-        # Convert determinant string into a true list
-        det = ast.literal_eval(det_str)
+        # Convert determinant bitstring into a list of occupied orbitals
+        det = det_ops.bits_to_det(det_bits)
 
         # Accumulate current walker contribution to energy expectation values
-        if det == sys_ham.ref_det:
+        if det_bits == ref_bits:
             sim_stats.cycle_en_denom += det_amp
             sim_stats.ref_weight = det_amp
         else:
             # Find the parity and the excitation matrix between the determinant and the reference determinant
-            excit_mat, parity = det_ops.calc_excit_mat_parity(sys_ham.ref_det, det)
+            excit_mat, parity = det_ops.calc_excit_mat_parity(ref_bits, det_bits)
             sim_stats.cycle_en_num += det_amp * sys_ham.slater_condon(sys_ham.ref_det, det, excit_mat, parity)
 
         # Stochastically round the walkers, if their amplitude is too low to ensure the walker list remains compact.
         if abs(det_amp) < sim_params.det_thresh:
             # Stochastically round up to sim_params.det_thresh with prob abs(det_amp)/sim_params.det_thresh, or disregard and skip this determinant
-            if np.random.rand(1)[0] < abs(det_amp)/sim_params.det_thresh:
+            if sys_ham.rand.random() < abs(det_amp)/sim_params.det_thresh:
                 det_amp = sim_params.det_thresh*np.sign(det_amp)
                 # Also update it in the main walker list
-                walkers[det_str] = det_amp
+                walkers[det_bits] = det_amp
             else:
                 # Kill walkers on this determinant entirely and remove the entry from the dictionary.
                 # Skip the rest of this walkers death/spawning
-                del walkers[det_str]
+                del walkers[det_bits]
                 continue
         sim_stats.nw += abs(det_amp)
         sim_stats.nocc_dets += 1
@@ -71,31 +72,31 @@ for sim_stats.iter_curr in range(sim_params.max_iter):
             ham_el_spawn = sys_ham.slater_condon(det, spawn_det, excit_mat, parity)
             # Compute spawning probability
             p_spawn = -sim_params.timestep * ham_el_spawn * det_amp / (p_gen * nspawn)
-            # Find the 'hashable' string representation of the determinant to look up in the spawned walker list
-            spawn_str = repr(spawn_det)
+            # Find the bitstring representation of the determinant to look up in the spawned walker list
+            spawn_bits = det_ops.det_to_bits(spawn_det)
 
             if abs(p_spawn) > 1.e-12:
-                if spawn_str in spawned_walkers:
-                    spawned_walkers[spawn_str].append((p_spawn, is_initiator))
+                if spawn_bits in spawned_walkers:
+                    spawned_walkers[spawn_bits].append((p_spawn, is_initiator))
                 else:
-                    spawned_walkers[spawn_str] = [(p_spawn, is_initiator)]
+                    spawned_walkers[spawn_bits] = [(p_spawn, is_initiator)]
 
         # DEATH STEP
         # Remember to now remove the reference energy from the determinant (this was done implicitly in part I)
         h_el_diag = sys_ham.slater_condon(det, det, None, None) - sim_stats.ref_energy
-        walkers[det_str] -= sim_params.timestep * (h_el_diag - sim_params.shift) * det_amp
+        walkers[det_bits] -= sim_params.timestep * (h_el_diag - sim_params.shift) * det_amp
         
 
     # ANNIHILATION. Run through the list of newly spawned walkers, and merge with the main list.
     # However, if we are using the initiator approximation, we should also test whether we want 
     # to transfer the walker weight across, or whether we want to abort the spawning attempt.
-    for spawn_str, spawn_amp in spawned_walkers.items():
+    for spawn_bits, spawn_amp in spawned_walkers.items():
         weight_from_all = sum(s[0] for s in spawn_amp)
         weight_from_inits = sum(s[0] for s in spawn_amp if s[1])
-        if spawn_str in walkers:
-            walkers[spawn_str] += weight_from_all
+        if spawn_bits in walkers:
+            walkers[spawn_bits] += weight_from_all
         else:
-            walkers[spawn_str] = weight_from_inits
+            walkers[spawn_bits] = weight_from_inits
 
             
 # Every sim_params.stats_cycle iterations, readjust shift (if in variable shift mode) and print out statistics.
@@ -6,9 +6,10 @@ class PARAMS:
            det_thresh=0.25, eqm_iters=50, max_iter=100000, stats_cycle=10, seed=7, init_thresh=None):
         ''' Class to set up fixed parameters for FCIQMC simulation'''
 
-        # Set random number seed
+        # Set up the random number generator from the seed. All random numbers in the simulation
+        # should be drawn from this (rather than the legacy global np.random functions).
         print('Setting random number seed to {}'.format(seed))
-        np.random.seed(seed)
+        self.rng = np.random.default_rng(seed)
 
         # The initial number of walkers
         self.nwalk_init = float(initwalkers)